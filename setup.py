@@ -1,11 +1,8 @@
 #!/usr/bin/env python3
 
-import importlib.util
+import argparse
+import functools
 import os
-import platform
-import re
-import shutil
-import subprocess
 import sys
 from pathlib import Path
 
@@ -16,24 +13,81 @@ system_deps = {
     "uv": ["uv"],
 }
 
-IS_WINDOWS = platform.system() == "Windows"
-IS_MAC = platform.system() == "Darwin"
-IS_LINUX = platform.system() == "Linux"
+# sys.platform needs no import; `platform` is only loaded for distro detection
+IS_WINDOWS = sys.platform == "win32"
+IS_MAC = sys.platform == "darwin"
+IS_LINUX = sys.platform.startswith("linux") or sys.platform == "android"
+
+OS_RELEASE = "/etc/os-release"
+LINUX_PACKAGE_MANAGERS = {
+    "android": "pkg",
+    "arch": "pacman",
+    "debian": "apt",
+    "ubuntu": "apt",
+    "fedora": "dnf",
+    "rhel": "dnf",
+    "centos": "yum",
+    "alpine": "apk",
+}
+BOOTSTRAP_CMDS = {
+    "pacman": "sudo pacman -S ",
+    "apt": "sudo apt install ",
+    "dnf": "sudo dnf install ",
+    "yum": "sudo yum install ",
+    "apk": "apk add ",
+    "pkg": "pkg install ",
+}
 
 
 def is_module_installed(name):
+    import importlib.util
+
     return importlib.util.find_spec(name) is not None
 
 
-def get_linux_distro():
-    if "android" in platform.platform() and platform.machine() == "aarch64":
-        return "android"
+def read_os_release():
+    import platform
+
+    if hasattr(platform, "freedesktop_os_release"):
+        try:
+            return platform.freedesktop_os_release()
+        except OSError:
+            return {}
+    os_release = {}
     try:
-        with open("/etc/os-release") as f:
-            os_release = f.read().lower()
-            return os_release
-    except Exception:
-        return "unknown"
+        with open(OS_RELEASE) as f:
+            for line in f:
+                key, sep, value = line.strip().partition("=")
+                if sep:
+                    os_release[key] = value.strip("\"'")
+    except OSError:
+        pass
+    return os_release
+
+
+def detect_linux_distro():
+    # returns ID followed by its ID_LIKE parents, most specific first
+    import platform
+
+    if sys.platform == "android" or (
+        "android" in platform.platform() and platform.machine() == "aarch64"
+    ):
+        return ["android"]
+    os_release = read_os_release()
+    distro_id = os_release.get("ID", "unknown").lower()
+    return [distro_id] + os_release.get("ID_LIKE", "").lower().split()
+
+
+def detect_linux_package_manager(distro_ids):
+    for distro_id in distro_ids:
+        if distro_id in LINUX_PACKAGE_MANAGERS:
+            return LINUX_PACKAGE_MANAGERS[distro_id]
+    return "unknown"
+
+
+@functools.lru_cache(maxsize=1)
+def get_linux_package_manager():
+    return detect_linux_package_manager(detect_linux_distro())
 
 
 def get_bootstrap_cmd():
@@ -42,52 +96,61 @@ def get_bootstrap_cmd():
     elif IS_MAC:
         return "brew install "
     elif IS_LINUX:
-        distro = get_linux_distro()
-        if distro == "arch":
-            return "sudo pacman -S "
-        elif distro == "debian":
-            return "sudo apt install "
-        elif distro == "fedora":
-            return "sudo dnf install "
-        elif distro == "alpine":
-            return "apk add "
-        elif distro == "centos":
-            return "sudo yum install "
-        elif distro == "android":
-            return "pkg install "
-        else:
+        cmd = BOOTSTRAP_CMDS.get(get_linux_package_manager(), "")
+        if not cmd:
             print(
                 "❌ Unsupported Linux distro. Please install the missing dependencies manually."
             )
+        return cmd
     else:
         print(
             "❌ Unsupported distro. Please install the missing dependencies manually."
         )
 
-        return "unknown"
+        return ""
+
+
+@functools.lru_cache(maxsize=None)
+def find_command(cmd):
+    import shutil
+
+    return shutil.which(cmd)
+
+
+def command_exists(cmd):
+    return find_command(cmd) is not None
 
 
 def bootstrap_dependencies():
-    is_all_good = True
+    missing = [dep for dep in system_deps if not command_exists(dep)]
+    if not missing:
+        print("✔ System tools verified.")
+        return True
+
     cmd = get_bootstrap_cmd()
-    for dep in system_deps:
-        reqs = system_deps[dep]
-        if not shutil.which(dep):
-            is_all_good = False
-            print(
-                f"Required system tool not found: {dep}. Unablae to install. Please run the following command(s) manually:"
+    lines = []
+    for dep in missing:
+        lines.append(
+            f"Required system tool not found: {dep}. Unable to install. Please run the following command(s) manually:"
+        )
+        for req in system_deps[dep]:
+            if cmd:
+                lines.append(f'🔧 Install {req} with: "{cmd}{req}"')
+            else:
+                lines.append(f"🔧 Install {req} manually")
+            # status = subprocess.run(str(cmd + req), check=True)
+            # if status != 0:
+            #     print(
+            #         f"❌ Failed to install {req}. Install with {cmd} {req} manually."
+            #     )
+            #     exit(status)
+        if dep == "uv":
+            lines.append(
+                '🔧 Or install uv with: "pip install --user uv" or "pipx install uv"'
             )
-            for req in reqs:
-                print(f'🔧 Instal {req} with: "{cmd}{req}"')
-                # status = subprocess.run(str(cmd + req), check=True)
-                # if status != 0:
-                #     print(
-                #         f"❌ Failed to install {req}. Install with {cmd} {req} manually."
-                #     )
-                #     exit(status)
-    if is_all_good:
-        print("✔ System tools verified.")
-    return is_all_good
+    # one write for the whole report instead of a print() per line
+    sys.stderr.write("\n".join(lines) + "\n")
+    return False
 
 
 def normalize_env():
@@ -105,9 +168,17 @@ def normalize_env():
                 Path(os.environ["HOME"]) / "AppData" / "Roaming"
             )
 
+        # Fallback XDG_CACHE_HOME
+        if "XDG_CACHE_HOME" not in os.environ:
+            os.environ["XDG_CACHE_HOME"] = str(
+                Path(os.environ["HOME"]) / "AppData" / "Local"
+            )
+
     elif IS_MAC or IS_LINUX:
         if "XDG_CONFIG_HOME" not in os.environ:
             os.environ["XDG_CONFIG_HOME"] = str(Path(os.environ["HOME"]) / ".config")
+        if "XDG_CACHE_HOME" not in os.environ:
+            os.environ["XDG_CACHE_HOME"] = str(Path(os.environ["HOME"]) / ".cache")
 
     else:
         sys.exit(
@@ -126,95 +197,6 @@ def assert_env_vars():
     print("✔ Environment variables set.")
 
 
-def assert_commands_exist():
-    missing = []
-    for cmd in REQUIRED_COMMANDS:
-        if shutil.which(cmd) is None:
-            missing.append(cmd)
-
-    if not missing:
-        print("✔ Required system tools are installed.")
-        return
-
-    print("\n❌ The following required system tools are missing:")
-    for cmd in missing:
-        print(f"   - {cmd}")
-
-    print("\n🔧 To install them:")
-
-    if IS_LINUX:
-        pkg = get_linux_package_manager()
-        print(f"🟢 Linux detected ({pkg})")
-
-        if pkg == "pacman":
-            install_cmds = {
-                "git": "sudo pacman -S git",
-                "rust": "sudo pacman -S rust",
-                "openssl": "sudo pacman -S openssl",
-                "python3": "sudo pacman -S python",
-            }
-        elif pkg == "apt":
-            install_cmds = {
-                "git": "sudo apt install git",
-                "rust": "sudo apt install rust",
-                "openssl": "sudo apt install openssl",
-                "python3": "sudo apt install python3",
-            }
-        elif pkg == "dnf":
-            install_cmds = {
-                "git": "sudo dnf install git",
-                "rust": "sudo dnf install rust",
-                "openssl": "sudo dnf install openssl",
-                "python3": "sudo dnf install python3",
-            }
-        elif pkg == "apk":
-            install_cmds = {
-                "git": "apk add git",
-                "rust": "apk add rust",
-                "openssl": "apk add openssl",
-                "python3": "apk add python3",
-            }
-        elif pkg == "pkg":
-            install_cmds = {
-                "git": "pkg install git",
-                "rust": "pkg install rust",
-                "openssl": "pkg install openssl",
-                "openssh": "pkg install openssh",
-                "python3": "pkg install python3",
-            }
-        else:
-            print("⚠ Unsupported or unknown Linux distro.")
-            install_cmds = {}
-    elif IS_MAC:
-        print("🍎 macOS detected. If you have Homebrew:")
-        install_cmds = {
-            "git": "brew install git",
-            "openssl": "brew install openssl",
-            "python3": "brew install python@3.12",
-        }
-    elif IS_WINDOWS:
-        print("🪟 Windows detected. Try one of the following:")
-        install_cmds = {
-            "git": "winget install --id Git.Git -e",
-            "openssl": "winget install --id ShiningLight.OpenSSL -e",
-            "python3": "winget install --id Python.Python.3.12 -e",
-        }
-        print("🟡 Or use Chocolatey: https://chocolatey.org/install")
-    else:
-        print("⚠ Unknown platform — please install manually.")
-        install_cmds = {}
-
-    for cmd in missing:
-        if cmd == "uv":
-            print(f"   - uv: pip install --user uv  # or pipx install uv")
-        elif cmd in install_cmds:
-            print(f"   - {cmd}: {install_cmds[cmd]}")
-        else:
-            print(f"   - {cmd}: install manually")
-
-    sys.exit("\n💥 Aborting setup due to missing tools.\n")
-
-
 def ensure_config_dir():
     config_dir = Path(os.environ["XDG_CONFIG_HOME"]) / "karllm"
     config_dir.mkdir(parents=True, exist_ok=True)
@@ -223,103 +205,221 @@ def ensure_config_dir():
 
 
 def write_config_file(config_path, uname, priv_key_path):
-    import yaml
-
-    if config_path.exists():
+    if os.path.isfile(config_path):
         print(f"✔ Config file already exists at {config_path}")
         return
+
+    import yaml
+
+    try:
+        from yaml import CSafeDumper as SafeDumper
+    except ImportError:
+        from yaml import SafeDumper
+
     config_data = {
         "username": uname,
         "secret": str(priv_key_path),
         "saveInteraction": True,
     }
     with open(config_path, "w") as f:
-        yaml.dump(config_data, f)
+        yaml.dump(config_data, f, Dumper=SafeDumper, default_flow_style=False)
     print(f"✔ Config written to {config_path}")
 
 
+def _run(argv, **kw):
+    # CPython only uses posix_spawn() for an executable given with a directory,
+    # close_fds=False and no cwd=; pass a tool's own directory flag instead of cwd=
+    if not os.path.dirname(argv[0]):
+        argv = [find_command(argv[0]) or argv[0]] + list(argv[1:])
+    kw.setdefault("close_fds", False)
+    kw.setdefault("check", True)
+    import subprocess
+
+    return subprocess.run(argv, **kw)
+
+
+def write_keypair(priv_path, pub_path):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+    key = Ed25519PrivateKey.generate()
+    priv_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    pub_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    # owner-only, like the private key files openssl writes
+    fd = os.open(priv_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(priv_pem)
+    pub_path.write_bytes(pub_pem)
+
+
+def write_keypair_openssl(priv_path, pub_path):
+    if IS_WINDOWS or not command_exists("sh"):
+        _run(["openssl", "genpkey", "-algorithm", "ED25519", "-out", str(priv_path)])
+        _run(
+            ["openssl", "pkey", "-in", str(priv_path), "-pubout", "-out", str(pub_path)]
+        )
+        return
+
+    import shlex
+
+    priv, pub = shlex.quote(str(priv_path)), shlex.quote(str(pub_path))
+    _run(
+        [
+            "sh",
+            "-c",
+            f"openssl genpkey -algorithm ED25519 -out {priv}"
+            f" && openssl pkey -in {priv} -pubout -out {pub}",
+        ]
+    )
+
+
 def generate_keypair(config_dir, uname):
     priv_path = config_dir / f"{uname}.priv"
     pub_path = config_dir / f"{uname}.pub"
-    if priv_path.exists() and pub_path.exists():
+    if os.path.isfile(priv_path) and os.path.isfile(pub_path):
         print("✔ Keypair already exists.")
         return priv_path, pub_path
 
-    subprocess.run(
-        ["openssl", "genpkey", "-algorithm", "ED25519", "-out", str(priv_path)],
-        check=True,
-    )
-    subprocess.run(
-        ["openssl", "pkey", "-in", str(priv_path), "-pubout", "-out", str(pub_path)],
-        check=True,
-    )
+    try:
+        write_keypair(priv_path, pub_path)
+    except ImportError:
+        write_keypair_openssl(priv_path, pub_path)
     print(f"✔ ED25519 keypair generated: {priv_path}, {pub_path}")
     return priv_path, pub_path
 
 
 def clone_repo(home_path):
     target_path = home_path / "karllm-client"
-    if target_path.exists():
+    if os.path.isdir(target_path):
         print("✔ Repo already cloned.")
         return target_path
-    subprocess.run(["git", "clone", REPO_URL, str(target_path)], check=True)
+    # shallow clone; run `git fetch --unshallow` inside it if history is needed
+    _run(
+        ["git", "clone", "--depth=1", "--single-branch", REPO_URL, str(target_path)],
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+    )
     print(f"✔ Repo cloned to {target_path}")
     return target_path
 
 
 def setup_venv(project_path):
-    subprocess.run(
-        ["uv", "venv", "--python", PYTHON_VERSION, ".venv"],
-        cwd=str(project_path),
-        check=True,
+    # --directory makes uv resolve config and relative paths from the checkout
+    _run(
+        [
+            "uv",
+            "--directory",
+            str(project_path),
+            "venv",
+            "--python",
+            PYTHON_VERSION,
+            ".venv",
+        ]
     )
 
     print(f"✔ Virtual environment created with Python {PYTHON_VERSION}")
 
 
+def get_uv_cache_dir():
+    if "UV_CACHE_DIR" in os.environ:
+        return Path(os.environ["UV_CACHE_DIR"])
+    return Path(os.environ["XDG_CACHE_HOME"]) / "uv"
+
+
 def install_requirements(project_path):
-    subprocess.run(
-        ["uv", "pip", "install", "-r", "requirements.txt"],
-        cwd=project_path,
-        check=True,
+    _run(
+        [
+            "uv",
+            "--directory",
+            str(project_path),
+            "pip",
+            "install",
+            "-r",
+            "requirements.txt",
+            "--link-mode=hardlink",
+            "--compile-bytecode",
+        ],
+        env={**os.environ, "UV_CACHE_DIR": str(get_uv_cache_dir())},
     )
     print("✔ Requirements installed using uv inside virtual environment")
 
 
-def get_username():
-    if "--username" in sys.argv:
-        idx = sys.argv.index("--username")
-        if idx + 1 < len(sys.argv):
-            uname = sys.argv[idx + 1].strip()
-            if re.fullmatch(r"[A-Za-z0-9_]+", uname):
-                print(f"✔ Username accepted (CLI): {uname}")
-                return uname
-            else:
-                sys.exit("✘ Invalid username provided via CLI.")
+def setup_client(home_path):
+    project_path = clone_repo(home_path)
+    setup_venv(project_path)
+    install_requirements(project_path)
+    return project_path
+
+
+def setup_config(uname):
+    config_dir = ensure_config_dir()
+    priv_key_path, _ = generate_keypair(config_dir, uname)
+    write_config_file(config_dir / "karllm.conf", uname, priv_key_path)
+    return config_dir
+
+
+def is_valid_username(uname):
+    # equivalent to fullmatch(r"[A-Za-z0-9_]+"); isalnum() alone accepts non-ASCII
+    return uname.isascii() and uname.replace("_", "a").isalnum()
+
+
+def parse_username(value):
+    uname = value.strip()
+    if not is_valid_username(uname):
+        raise argparse.ArgumentTypeError(
+            f"invalid username {value!r} (alphanumeric and underscores only)"
+        )
+    return uname
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Set up the karllm client.")
+    parser.add_argument(
+        "--username",
+        type=parse_username,
+        help="username to configure; prompted for when omitted",
+    )
+    args, _ = parser.parse_known_args()
+    return args
+
+
+def get_username(uname=None):
+    if uname is not None:
+        print(f"✔ Username accepted (CLI): {uname}")
+        return uname
     # fallback to interactive
     while True:
         uname = input("Enter a username (alphanumeric only, no spaces): ").strip()
-        if re.fullmatch(r"[A-Za-z0-9_]+", uname):
+        if is_valid_username(uname):
             print(f"✔ Username accepted: {uname}")
             return uname
         print("✘ Invalid username. Try again.")
 
 
 def main():
+    args = parse_args()
     normalize_env()
     if not bootstrap_dependencies():
         exit(1)
     assert_env_vars()
 
     home = Path(os.environ["HOME"])
-    project_path = clone_repo(home)
-    setup_venv(project_path)
-    install_requirements(project_path)
+    # ask before starting workers so the prompt isn't interleaved with their output
+    uname = get_username(args.username)
 
-    uname = get_username()
-    config_dir = ensure_config_dir()
-    priv_key_path, _ = generate_keypair(config_dir, uname)
-    write_config_file(config_dir / "karllm.conf", uname, priv_key_path)
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        client = executor.submit(setup_client, home)
+        config = executor.submit(setup_config, uname)
+        client.result()
+        config.result()
 
     print("✅ Setup complete!")
 